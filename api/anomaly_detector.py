@@ -3,12 +3,17 @@
 import math
 from typing import Optional
 
+import numpy as np
+
+# Standard deviations below this (in dollars) are rounding noise from equal costs
+ZERO_STD_DEV_TOLERANCE = 1e-9
+
 
 def calculate_mean(values: list[float]) -> float:
     """Calculate the arithmetic mean of a list of values."""
     if not values:
         return 0.0
-    return sum(values) / len(values)
+    return math.fsum(values) / len(values)
 
 
 def calculate_std_dev(values: list[float], mean: Optional[float] = None) -> float:
@@ -19,56 +24,136 @@ def calculate_std_dev(values: list[float], mean: Optional[float] = None) -> floa
     if mean is None:
         mean = calculate_mean(values)
 
-    variance = sum((x - mean) ** 2 for x in values) / len(values)
+    variance = math.fsum((x - mean) * (x - mean) for x in values) / len(values)
     return math.sqrt(variance)
 
 
 def calculate_z_score(value: float, mean: float, std_dev: float) -> float:
     """Calculate the Z-score for a value given mean and standard deviation."""
-    if std_dev == 0:
+    if math.isclose(std_dev, 0.0, abs_tol=ZERO_STD_DEV_TOLERANCE):
         return 0.0
     return (value - mean) / std_dev
 
 
-def detect_anomalies(cost_data: list[dict], threshold: float = 2.0) -> list[dict]:
+def update_running_stats(stats: tuple[int, float, float], value: float) -> tuple[int, float, float]:
+    """Fold a value into running (count, mean, M2) statistics using Welford's algorithm."""
+    n, mean, m2 = stats
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    return n, mean, m2
+
+
+def merge_running_stats(a: tuple[int, float, float], b: tuple[int, float, float]) -> tuple[int, float, float]:
+    """Combine running (count, mean, M2) statistics of two disjoint partitions (Chan et al.)."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return n, mean, m2
+
+
+def running_std_dev(stats: tuple[int, float, float]) -> float:
+    """Calculate the population standard deviation from running (count, mean, M2) statistics."""
+    n, _, m2 = stats
+    if n < 2:
+        return 0.0
+    return math.sqrt(m2 / n)
+
+
+def top_service(services: dict[str, float]) -> str:
+    """Return the highest-cost service in a breakdown, or "unknown" if it is empty."""
+    max_service, max_cost = "unknown", float("-inf")
+    for service, service_cost in services.items():
+        if service_cost > max_cost:
+            max_service, max_cost = service, service_cost
+    return max_service
+
+
+def _find_outliers(costs: np.ndarray, threshold: float) -> tuple[float, np.ndarray, np.ndarray]:
+    """Find costs more than `threshold` standard deviations from the mean.
+
+    Works on the deviation buffer throughout: the variance is its dot product and
+    the cutoff is compared in dollars, so Z-scores are only divided out for hits.
+
+    Returns:
+        Tuple of mean, indices of outlying costs, and their Z-scores.
+    """
+    mean = float(costs.mean())
+    deviations = costs - mean
+    std_dev = math.sqrt(float(deviations @ deviations) / len(costs)) if len(costs) >= 2 else 0.0
+    if math.isclose(std_dev, 0.0, abs_tol=ZERO_STD_DEV_TOLERANCE):
+        return mean, np.empty(0, dtype=np.intp), np.empty(0)
+
+    hits = np.flatnonzero(np.abs(deviations) > threshold * std_dev)
+    return mean, hits, deviations[hits] / std_dev
+
+
+def _anomaly_record(date: str, cost: float, z_score: float, mean: float, max_service: str) -> dict:
+    """Build the API representation of a flagged day."""
+    return {
+        "date": date,
+        "total_cost": cost,
+        "z_score": z_score,
+        "expected_cost": mean,
+        "deviation": cost - mean,
+        "severity": "high" if abs(z_score) > 3 else "medium",
+        "reason": f"Unusual spike in {max_service} costs"
+    }
+
+
+def _detect_anomalies_columnar(cost_data: dict, threshold: float) -> list[dict]:
+    """Detect anomalies in column-oriented cost data (see mock_data.get_mock_costs_soa)."""
+    totals = cost_data["totals"]
+    if len(totals) == 0:
+        return []
+
+    mean, hits, z_scores = _find_outliers(totals, threshold)
+
+    dates = cost_data["dates"]
+    top_services = cost_data["top_services"]
+    return [
+        _anomaly_record(dates[i], float(totals[i]), z_score, mean, top_services[i])
+        for i, z_score in zip(hits.tolist(), z_scores.tolist())
+    ]
+
+
+def detect_anomalies(cost_data: list[dict] | dict, threshold: float = 2.0) -> list[dict]:
     """Detect anomalies in cost data using Z-score method.
 
     Args:
-        cost_data: List of daily cost records with 'date' and 'total_cost' fields.
+        cost_data: List of daily cost records with 'date' and 'total_cost' fields,
+            or a column-oriented dict as returned by mock_data.get_mock_costs_soa.
         threshold: Z-score threshold for flagging anomalies (default: 2.0 std devs).
 
     Returns:
         List of anomaly records with date, cost, z_score, and reason.
     """
+    if isinstance(cost_data, dict):
+        return _detect_anomalies_columnar(cost_data, threshold)
+
     if not cost_data:
         return []
 
-    # Extract total costs
-    costs = [day["total_cost"] for day in cost_data]
-
-    # Calculate statistics
-    mean = calculate_mean(costs)
-    std_dev = calculate_std_dev(costs, mean)
+    # Vectorized statistics over a contiguous float64 buffer
+    costs = np.fromiter((day["total_cost"] for day in cost_data), dtype=np.float64, count=len(cost_data))
+    mean, hits, z_scores = _find_outliers(costs, threshold)
 
     anomalies = []
 
-    for day in cost_data:
-        cost = day["total_cost"]
-        z_score = calculate_z_score(cost, mean, std_dev)
-
-        if abs(z_score) > threshold:
-            # Determine which service contributed most to the anomaly
-            services = day.get("services", {})
-            max_service = max(services.items(), key=lambda x: x[1])[0] if services else "unknown"
-
-            anomalies.append({
-                "date": day["date"],
-                "total_cost": cost,
-                "z_score": round(z_score, 2),
-                "expected_cost": round(mean, 2),
-                "deviation": round(cost - mean, 2),
-                "severity": "high" if abs(z_score) > 3 else "medium",
-                "reason": f"Unusual spike in {max_service} costs"
-            })
+    # Only flagged rows need per-record Python work
+    for i, z_score in zip(hits.tolist(), z_scores.tolist()):
+        day = cost_data[i]
+
+        # Determine which service contributed most to the anomaly
+        max_service = top_service(day.get("services", {}))
+
+        anomalies.append(_anomaly_record(day["date"], day["total_cost"], z_score, mean, max_service))
 
     return anomalies
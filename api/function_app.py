@@ -1,11 +1,16 @@
-import json
+import math
 import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime, timedelta, timezone
+from typing import Annotated
 import azure.functions as func
-from pydantic import BaseModel, Field
+import msgspec
+import orjson
 
-from mock_data import get_mock_costs
-from anomaly_detector import detect_anomalies
+from mock_data import get_mock_costs, get_mock_costs_json, get_mock_costs_soa
+from anomaly_detector import calculate_z_score, detect_anomalies, running_std_dev, update_running_stats
 
 app = func.FunctionApp()
 
@@ -16,8 +21,22 @@ DB_NAME = os.getenv("COSMOS_DB", "costdb")
 # Check if Cosmos DB is configured
 USE_COSMOS = bool(COSMOS_URL and COSMOS_KEY)
 
-# In-memory storage for mock mode
-_mock_events = []
+# In-memory storage for mock mode, bounded so warm workers don't grow without limit
+MAX_MOCK_EVENTS = 10_000
+_mock_events: deque[dict] = deque(maxlen=MAX_MOCK_EVENTS)
+
+# Running (count, mean, M2) cost statistics per subscription, updated on mock-mode
+# ingest; least recently used subscriptions are evicted beyond MAX_TRACKED_SUBSCRIPTIONS
+MAX_TRACKED_SUBSCRIPTIONS = 1_000
+_stats: OrderedDict[str, tuple[int, float, float]] = OrderedDict()
+
+# Serialized mock-mode responses, keyed by query parameters: key -> (timestamp, body)
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 64
+_anomaly_cache: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+_summary_cache: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+# Sync handlers run on the worker's thread pool, so cache access is serialized
+_cache_lock = threading.Lock()
 
 
 def _client():
@@ -31,6 +50,36 @@ def _db():
     return _client().get_database_client(DB_NAME)
 
 
+def _cache_get(cache: OrderedDict, key: tuple) -> bytes | None:
+    """Return a cached response body if it is still fresh."""
+    with _cache_lock:
+        entry = cache.get(key)
+    if entry is None or time.monotonic() - entry[0] >= CACHE_TTL_SECONDS:
+        return None
+    return entry[1]
+
+
+def _cache_put(cache: OrderedDict, key: tuple, body: bytes) -> bytes:
+    """Store a response body, evicting stale entries and then the oldest to stay bounded."""
+    with _cache_lock:
+        now = time.monotonic()
+        cache.pop(key, None)
+        # Entries are kept in insertion order, so stale ones are always at the front
+        while cache and (
+            len(cache) >= CACHE_MAX_ENTRIES
+            or now - next(iter(cache.values()))[0] >= CACHE_TTL_SECONDS
+        ):
+            cache.popitem(last=False)
+        cache[key] = (now, body)
+    return body
+
+
+def _clear_caches() -> None:
+    with _cache_lock:
+        _anomaly_cache.clear()
+        _summary_cache.clear()
+
+
 def add_cors_headers(response: func.HttpResponse) -> func.HttpResponse:
     """Add CORS headers for local development."""
     response.headers["Access-Control-Allow-Origin"] = "*"
@@ -39,25 +88,34 @@ def add_cors_headers(response: func.HttpResponse) -> func.HttpResponse:
     return response
 
 
-class CostEvent(BaseModel):
+class CostEvent(msgspec.Struct, kw_only=True):
     subscriptionId: str = "demo"
     ts: str  # ISO string
     service: str
     resourceGroup: str
     region: str = "unknown"
-    costUsd: float = Field(ge=0)
+    costUsd: Annotated[float, msgspec.Meta(ge=0)]
     usageQty: float | None = None
     tags: dict = {}
 
 
+def _score_event(subscription_id: str, cost: float) -> float:
+    """Score a cost against the subscription's earlier events, then fold it into their stats."""
+    stats = _stats.pop(subscription_id, (0, 0.0, 0.0))
+    z_score = calculate_z_score(cost, stats[1], running_std_dev(stats))
+    _stats[subscription_id] = update_running_stats(stats, cost)
+    if len(_stats) > MAX_TRACKED_SUBSCRIPTIONS:
+        _stats.popitem(last=False)
+    return z_score
+
+
 @app.route(route="events", methods=["POST", "OPTIONS"], auth_level=func.AuthLevel.ANONYMOUS)
 def ingest_event(req: func.HttpRequest) -> func.HttpResponse:
     if req.method == "OPTIONS":
         return add_cors_headers(func.HttpResponse(status_code=204))
 
     try:
-        body = req.get_json()
-        ev = CostEvent(**body)
+        ev = msgspec.json.decode(req.get_body(), type=CostEvent)
         dt = datetime.fromisoformat(ev.ts.replace("Z", "+00:00"))
         date = dt.date().isoformat()
 
@@ -74,21 +132,25 @@ def ingest_event(req: func.HttpRequest) -> func.HttpResponse:
             "tags": ev.tags or {}
         }
 
+        result = {"ok": True, "id": doc["id"], "mode": "cosmos" if USE_COSMOS else "mock"}
+
         if USE_COSMOS:
             events = _db().get_container_client("events")
             events.upsert_item(doc)
         else:
             # Mock mode: store in memory
             _mock_events.append(doc)
+            result["z_score"] = _score_event(ev.subscriptionId, doc["costUsd"])
+        _clear_caches()
 
         return add_cors_headers(func.HttpResponse(
-            json.dumps({"ok": True, "id": doc["id"], "mode": "cosmos" if USE_COSMOS else "mock"}),
+            orjson.dumps(result),
             mimetype="application/json",
             status_code=200
         ))
     except Exception as e:
         return add_cors_headers(func.HttpResponse(
-            json.dumps({"ok": False, "error": str(e)}),
+            orjson.dumps({"ok": False, "error": str(e)}),
             mimetype="application/json",
             status_code=400
         ))
@@ -107,19 +169,18 @@ def get_costs(req: func.HttpRequest) -> func.HttpResponse:
         if USE_COSMOS:
             # TODO: Query Cosmos for aggregated daily costs
             return add_cors_headers(func.HttpResponse(
-                json.dumps({"success": True, "data": [], "mode": "cosmos", "todo": "implement query"}),
+                orjson.dumps({"success": True, "data": [], "mode": "cosmos", "todo": "implement query"}),
                 mimetype="application/json"
             ))
         else:
-            # Mock mode: use generated data
-            cost_data = get_mock_costs(days)
+            # Mock mode: use pre-serialized generated data
             return add_cors_headers(func.HttpResponse(
-                json.dumps({"success": True, "data": cost_data, "mode": "mock"}),
+                get_mock_costs_json(days),
                 mimetype="application/json"
             ))
     except Exception as e:
         return add_cors_headers(func.HttpResponse(
-            json.dumps({"success": False, "error": str(e)}),
+            orjson.dumps({"success": False, "error": str(e)}),
             mimetype="application/json",
             status_code=500
         ))
@@ -135,37 +196,41 @@ def summary(req: func.HttpRequest) -> func.HttpResponse:
         if USE_COSMOS:
             # TODO: Query Cosmos for summary
             return add_cors_headers(func.HttpResponse(
-                json.dumps({"success": True, "mode": "cosmos", "todo": "implement query"}),
+                orjson.dumps({"success": True, "mode": "cosmos", "todo": "implement query"}),
                 mimetype="application/json"
             ))
         else:
             # Mock mode: calculate from mock data
-            cost_data = get_mock_costs(30)
-            total = sum(d["total_cost"] for d in cost_data)
-            avg = total / len(cost_data) if cost_data else 0
-
-            # Service breakdown
-            services = {}
-            for day in cost_data:
-                for svc, cost in day["services"].items():
-                    services[svc] = services.get(svc, 0) + cost
-
-            return add_cors_headers(func.HttpResponse(
-                json.dumps({
+            days = 30
+            key = (days,)
+            body = _cache_get(_summary_cache, key)
+            if body is None:
+                cost_data = get_mock_costs(days)
+
+                # Total and service breakdown in a single pass
+                total = 0.0
+                services = defaultdict(float)
+                for day in cost_data:
+                    total += day["total_cost"]
+                    for svc, cost in day["services"].items():
+                        services[svc] += cost
+                avg = total / len(cost_data) if cost_data else 0
+
+                body = _cache_put(_summary_cache, key, orjson.dumps({
                     "success": True,
                     "mode": "mock",
                     "data": {
-                        "total_cost": round(total, 2),
-                        "daily_average": round(avg, 2),
+                        "total_cost": total,
+                        "daily_average": avg,
                         "days": len(cost_data),
-                        "services": {k: round(v, 2) for k, v in services.items()}
+                        "services": services
                     }
-                }),
-                mimetype="application/json"
-            ))
+                }))
+
+            return add_cors_headers(func.HttpResponse(body, mimetype="application/json"))
     except Exception as e:
         return add_cors_headers(func.HttpResponse(
-            json.dumps({"success": False, "error": str(e)}),
+            orjson.dumps({"success": False, "error": str(e)}),
             mimetype="application/json",
             status_code=500
         ))
@@ -179,32 +244,41 @@ def list_anomalies(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         threshold = float(req.params.get("threshold", "2.0"))
+        if not math.isfinite(threshold):
+            return add_cors_headers(func.HttpResponse(
+                orjson.dumps({"success": False, "error": "threshold must be a finite number"}),
+                mimetype="application/json",
+                status_code=400
+            ))
         threshold = min(max(threshold, 1.0), 5.0)
 
         if USE_COSMOS:
             # TODO: Query Cosmos for stored anomalies
             return add_cors_headers(func.HttpResponse(
-                json.dumps({"success": True, "data": [], "mode": "cosmos", "todo": "implement query"}),
+                orjson.dumps({"success": True, "data": [], "mode": "cosmos", "todo": "implement query"}),
                 mimetype="application/json"
             ))
         else:
             # Mock mode: detect from mock data
-            cost_data = get_mock_costs(30)
-            anomalies = detect_anomalies(cost_data, threshold)
-
-            return add_cors_headers(func.HttpResponse(
-                json.dumps({
+            days = 30
+            key = (days, threshold)
+            body = _cache_get(_anomaly_cache, key)
+            if body is None:
+                cost_data = get_mock_costs_soa(days)
+                anomalies = detect_anomalies(cost_data, threshold)
+
+                body = _cache_put(_anomaly_cache, key, orjson.dumps({
                     "success": True,
                     "data": anomalies,
                     "count": len(anomalies),
                     "threshold": threshold,
                     "mode": "mock"
-                }),
-                mimetype="application/json"
-            ))
+                }))
+
+            return add_cors_headers(func.HttpResponse(body, mimetype="application/json"))
     except Exception as e:
         return add_cors_headers(func.HttpResponse(
-            json.dumps({"success": False, "error": str(e)}),
+            orjson.dumps({"success": False, "error": str(e)}),
             mimetype="application/json",
             status_code=500
         ))
@@ -214,7 +288,7 @@ def list_anomalies(req: func.HttpRequest) -> func.HttpResponse:
 def status(req: func.HttpRequest) -> func.HttpResponse:
     """Return API status and configuration mode."""
     return add_cors_headers(func.HttpResponse(
-        json.dumps({
+        orjson.dumps({
             "status": "ok",
             "mode": "cosmos" if USE_COSMOS else "mock",
             "cosmos_configured": USE_COSMOS,
@@ -1,72 +1,134 @@
 """Mock cost data generator for Cloud Cost Anomaly Detection."""
 
-import random
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
 
+import numpy as np
+import orjson
 
-def generate_mock_costs(days: int = 30) -> list[dict]:
+from anomaly_detector import top_service
+
+# Services and their base daily costs (will vary slightly each day)
+SERVICE_NAMES = ("compute", "storage", "network", "database")
+BASE_COSTS = np.array([600.0, 300.0, 200.0, 250.0])
+
+
+def generate_mock_costs(days: int = 30, seed: Optional[int] = None) -> list[dict]:
     """Generate mock daily cost data for the specified number of days.
 
     Args:
         days: Number of days of historical data to generate.
+        seed: Optional seed for reproducible data.
 
     Returns:
         List of daily cost records with service breakdown.
     """
-    data = []
-    base_date = datetime.now() - timedelta(days=days) 
-
-    # Base costs for each service (will vary slightly each day)
-    base_costs = {
-        "compute": 600.0,
-        "storage": 300.0,
-        "network": 200.0,
-        "database": 250.0
+    rng = np.random.default_rng(seed)
+    base_date = datetime.now() - timedelta(days=days)
+
+    # Normal variation: +/- 15% for every (day, service) pair
+    variations = rng.uniform(-0.15, 0.15, size=(days, len(SERVICE_NAMES)))
+    service_costs = BASE_COSTS * (1 + variations)
+
+    # Inject some anomalies (roughly 10% of days): spike one service by 50-100%
+    spike_days = rng.random(days) < 0.1
+    spike_services = rng.integers(0, len(SERVICE_NAMES), size=days)
+    spike_factors = rng.uniform(1.5, 2.0, size=days)
+    service_costs[spike_days, spike_services[spike_days]] *= spike_factors[spike_days]
+
+    # Quantize to whole cents so daily totals are exact integer sums of the services
+    service_cents = np.rint(service_costs * 100).astype(np.int64)
+    total_cents = service_cents.sum(axis=1)
+
+    return [
+        {
+            "date": (base_date + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "total_cost": total / 100,
+            "services": {name: cents / 100 for name, cents in zip(SERVICE_NAMES, costs)}
+        }
+        for i, (total, costs) in enumerate(zip(total_cents.tolist(), service_cents.tolist()))
+    ]
+
+
+# Cache the generated data per window size so it's consistent within a session.
+# The default 30-day window is generated once at import, off the first request's path
+PRELOAD_DAYS = 30
+PRELOAD_SEED = 42
+_preloaded_costs = tuple(generate_mock_costs(PRELOAD_DAYS, seed=PRELOAD_SEED))
+
+
+# The cached functions take `days` positionally so get_mock_costs(30) and
+# get_mock_costs(days=30) share one entry.
+@lru_cache(maxsize=8)
+def _cached_costs(days: int) -> tuple[dict, ...]:
+    return tuple(generate_mock_costs(days))
+
+
+@lru_cache(maxsize=8)
+def _cached_costs_json(days: int) -> bytes:
+    return orjson.dumps({"success": True, "data": get_mock_costs(days), "mode": "mock"})
+
+
+@lru_cache(maxsize=8)
+def _cached_costs_soa(days: int) -> dict:
+    cost_data = get_mock_costs(days)
+    totals = np.array([day["total_cost"] for day in cost_data], dtype=np.float64)
+    # Shared between callers, so guard against in-place modification
+    totals.setflags(write=False)
+    return {
+        "dates": tuple(day["date"] for day in cost_data),
+        "totals": totals,
+        # Resolved once per dataset so detection never scans the service breakdown
+        "top_services": tuple(top_service(day["services"]) for day in cost_data)
     }
 
-    for i in range(days):
-        current_date = base_date + timedelta(days=i)
 
-        # Generate daily costs with some random variation
-        services = {}
-        for service, base_cost in base_costs.items():
-            # Normal variation: +/- 15%
-            variation = random.uniform(-0.15, 0.15)
-            services[service] = round(base_cost * (1 + variation), 2)
+def get_mock_costs(days: int = 30) -> tuple[dict, ...]:
+    """Get mock cost data, using cached data if available.
 
-        # Inject some anomalies (roughly 10% of days)
-        if random.random() < 0.1:
-            # Pick a random service to spike
-            spike_service = random.choice(list(services.keys()))
-            # Spike it by 50-100%
-            spike_factor = random.uniform(1.5, 2.0)
-            services[spike_service] = round(services[spike_service] * spike_factor, 2)
+    Args:
+        days: Number of days of historical data.
 
-        total_cost = round(sum(services.values()), 2)
+    Returns:
+        Tuple of daily cost records, shared between callers (do not mutate).
+    """
+    if days == PRELOAD_DAYS:
+        return _preloaded_costs
+    return _cached_costs(days)
 
-        data.append({
-            "date": current_date.strftime("%Y-%m-%d"),
-            "total_cost": total_cost,
-            "services": services
-        })
 
-    return data
+def get_mock_costs_json(days: int = 30) -> bytes:
+    """Get the serialized /costs response body for the mock cost data.
 
+    Args:
+        days: Number of days of historical data.
 
-# Cache the generated data so it's consistent within a session
-_cached_data = None
+    Returns:
+        UTF-8 encoded JSON response body.
+    """
+    return _cached_costs_json(days)
 
 
-def get_mock_costs(days: int = 30) -> list[dict]:
-    """Get mock cost data, using cached data if available.
+def get_mock_costs_soa(days: int = 30) -> dict:
+    """Get the mock cost data as parallel columns instead of per-day records.
 
     Args:
         days: Number of days of historical data.
 
     Returns:
-        List of daily cost records.
+        Dict with 'dates' (tuple of str), 'totals' (float64 array of shape (days,))
+        and 'top_services' (highest-cost service per day), derived from
+        get_mock_costs(days).
+    """
+    return _cached_costs_soa(days)
+
+
+def clear_mock_cache() -> None:
+    """Discard cached mock data so the next request regenerates it.
+
+    The preloaded default window is deterministic and is kept.
     """
-    global _cached_data
-    if _cached_data is None or len(_cached_data) != days:
-        _cached_data = generate_mock_costs(days)
-    return _cached_data
+    _cached_costs.cache_clear()
+    _cached_costs_json.cache_clear()
+    _cached_costs_soa.cache_clear()
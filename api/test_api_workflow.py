@@ -1,10 +1,30 @@
 """Unit tests for Cloud Cost Anomaly Detection API workflow."""
 
+import json
 import unittest
+from collections import deque
 from unittest.mock import MagicMock, patch
 
-from anomaly_detector import calculate_mean, calculate_std_dev, calculate_z_score, detect_anomalies
-from mock_data import generate_mock_costs, get_mock_costs
+import numpy as np
+
+from anomaly_detector import (
+    _find_outliers,
+    calculate_mean,
+    calculate_std_dev,
+    calculate_z_score,
+    detect_anomalies,
+    merge_running_stats,
+    running_std_dev,
+    top_service,
+    update_running_stats,
+)
+from mock_data import (
+    clear_mock_cache,
+    generate_mock_costs,
+    get_mock_costs,
+    get_mock_costs_json,
+    get_mock_costs_soa,
+)
 
 
 class TestAnomalyDetector(unittest.TestCase):
@@ -26,6 +46,10 @@ class TestAnomalyDetector(unittest.TestCase):
         std_dev = calculate_std_dev(values, mean)
         self.assertTrue(14.0 < std_dev < 15.0)
 
+    def test_calculate_mean_exact_summation(self):
+        """Test mean calculation does not lose precision to rounding."""
+        self.assertEqual(calculate_mean([0.1] * 10), 0.1)
+
     def test_calculate_std_dev_empty(self):
         """Test std dev with empty list returns 0."""
         self.assertEqual(calculate_std_dev([]), 0.0)
@@ -42,6 +66,10 @@ class TestAnomalyDetector(unittest.TestCase):
         """Test Z-score returns 0 when std dev is 0."""
         self.assertEqual(calculate_z_score(100.0, 100.0, 0.0), 0.0)
 
+    def test_calculate_z_score_near_zero_std_dev(self):
+        """Test Z-score returns 0 when std dev is only rounding noise."""
+        self.assertEqual(calculate_z_score(100.0, 99.9999999999999, 1e-13), 0.0)
+
     def test_calculate_z_score_negative(self):
         """Test Z-score calculation for values below mean."""
         self.assertEqual(calculate_z_score(50.0, 100.0, 25.0), -2.0)
@@ -56,6 +84,65 @@ class TestAnomalyDetector(unittest.TestCase):
         std_dev = calculate_std_dev(values)
         self.assertEqual(std_dev, 5.0)
 
+    def test_find_outliers_matches_scalar_helpers(self):
+        """Test outlier Z-scores match the scalar helpers."""
+        values = [10.0, 20.0, 30.0, 40.0, 50.0]
+        mean = calculate_mean(values)
+        std_dev = calculate_std_dev(values)
+
+        found_mean, hits, z_scores = _find_outliers(np.array(values), 1.0)
+
+        self.assertEqual(found_mean, mean)
+        self.assertEqual(hits.tolist(), [0, 4])
+        for i, z_score in zip(hits, z_scores):
+            self.assertAlmostEqual(z_score, calculate_z_score(values[i], mean, std_dev))
+
+    def test_find_outliers_constant_values(self):
+        """Test no outliers are found when std dev is 0."""
+        mean, hits, z_scores = _find_outliers(np.array([5.0, 5.0, 5.0]), 0.0)
+
+        self.assertEqual(mean, 5.0)
+        self.assertEqual(hits.tolist(), [])
+        self.assertEqual(z_scores.tolist(), [])
+
+    def test_top_service(self):
+        """Test the highest-cost service is chosen, first one winning ties."""
+        self.assertEqual(top_service({"compute": 5.0, "storage": 9.0, "network": 9.0}), "storage")
+        self.assertEqual(top_service({}), "unknown")
+
+    def test_running_stats_match_batch(self):
+        """Test running Welford statistics match the batch helpers."""
+        values = [10.0, 20.0, 30.0, 40.0, 50.0]
+        stats = (0, 0.0, 0.0)
+        for value in values:
+            stats = update_running_stats(stats, value)
+
+        self.assertEqual(stats[0], 5)
+        self.assertAlmostEqual(stats[1], calculate_mean(values))
+        self.assertAlmostEqual(running_std_dev(stats), calculate_std_dev(values))
+
+    def test_merge_running_stats_matches_sequential(self):
+        """Test merging partition statistics matches folding all values in order."""
+        values = [12.5, 40.0, 3.0, 18.0, 27.5, 9.0, 31.0]
+        partials = []
+        for chunk in (values[:3], values[3:5], values[5:], []):
+            stats = (0, 0.0, 0.0)
+            for value in chunk:
+                stats = update_running_stats(stats, value)
+            partials.append(stats)
+
+        merged = (0, 0.0, 0.0)
+        for stats in partials:
+            merged = merge_running_stats(merged, stats)
+
+        self.assertEqual(merged[0], len(values))
+        self.assertAlmostEqual(merged[1], calculate_mean(values))
+        self.assertAlmostEqual(running_std_dev(merged), calculate_std_dev(values))
+
+    def test_running_std_dev_single_value(self):
+        """Test running std dev with a single value returns 0."""
+        self.assertEqual(running_std_dev(update_running_stats((0, 0.0, 0.0), 100.0)), 0.0)
+
 
 class TestDetectAnomalies(unittest.TestCase):
     """Tests for the detect_anomalies function."""
@@ -91,6 +178,15 @@ class TestDetectAnomalies(unittest.TestCase):
         anomalies = detect_anomalies(cost_data, threshold=2.0)
         self.assertEqual(len(anomalies), 0)
 
+    def test_detect_anomalies_equal_costs_with_rounding_noise(self):
+        """Test equal costs are never flagged, even when their mean is inexact."""
+        cost_data = [
+            {"date": f"2024-01-{i:02d}", "total_cost": 1370.37, "services": {"compute": 1370.37}}
+            for i in range(1, 8)
+        ]
+
+        self.assertEqual(detect_anomalies(cost_data, threshold=0.5), [])
+
     def test_detect_anomalies_severity_levels(self):
         """Test that severity is assigned correctly based on z-score."""
         cost_data = [
@@ -139,6 +235,25 @@ class TestDetectAnomalies(unittest.TestCase):
             # Reason should mention compute as the top contributor
             self.assertIn("compute", anomalies[0]["reason"].lower())
 
+    def test_detect_anomalies_matches_helper_statistics(self):
+        """Test single-pass statistics agree with calculate_mean/calculate_std_dev."""
+        cost_data = [
+            {"date": "2024-01-01", "total_cost": 1000.0, "services": {"compute": 1000.0}},
+            {"date": "2024-01-02", "total_cost": 1100.0, "services": {"compute": 1100.0}},
+            {"date": "2024-01-03", "total_cost": 950.0, "services": {"compute": 950.0}},
+            {"date": "2024-01-04", "total_cost": 1020.0, "services": {"compute": 1020.0}},
+            {"date": "2024-01-05", "total_cost": 3000.0, "services": {"compute": 3000.0}},  # Spike
+        ]
+        costs = [day["total_cost"] for day in cost_data]
+        mean = calculate_mean(costs)
+        std_dev = calculate_std_dev(costs, mean)
+
+        anomalies = detect_anomalies(cost_data, threshold=1.5)
+
+        self.assertEqual(len(anomalies), 1)
+        self.assertAlmostEqual(anomalies[0]["expected_cost"], mean)
+        self.assertAlmostEqual(anomalies[0]["z_score"], (3000.0 - mean) / std_dev)
+
 
 class TestMockData(unittest.TestCase):
     """Tests for mock data generation."""
@@ -174,6 +289,16 @@ class TestMockData(unittest.TestCase):
             services_sum = sum(day["services"].values())
             self.assertLess(abs(day["total_cost"] - services_sum), 0.01)  # Allow small float error
 
+    def test_generate_mock_costs_whole_cents(self):
+        """Test that costs are whole cents and totals are exact cent sums."""
+        data = generate_mock_costs(days=30, seed=7)
+
+        for day in data:
+            service_cents = [round(cost * 100) for cost in day["services"].values()]
+            for cost, cents in zip(day["services"].values(), service_cents):
+                self.assertEqual(cost, cents / 100)
+            self.assertEqual(day["total_cost"], sum(service_cents) / 100)
+
     def test_generate_mock_costs_date_format(self):
         """Test that dates are in correct ISO format (YYYY-MM-DD)."""
         import re
@@ -189,6 +314,14 @@ class TestMockData(unittest.TestCase):
             data = generate_mock_costs(days=days)
             self.assertEqual(len(data), days)
 
+    def test_generate_mock_costs_seeded(self):
+        """Test that a seed makes generated costs reproducible."""
+        data1 = generate_mock_costs(days=30, seed=42)
+        data2 = generate_mock_costs(days=30, seed=42)
+
+        self.assertEqual(data1, data2)
+        self.assertIsInstance(data1[0]["total_cost"], float)
+
     def test_generate_mock_costs_positive_values(self):
         """Test that all cost values are positive."""
         data = generate_mock_costs(days=10)
@@ -234,8 +367,7 @@ class TestAPIWorkflow(unittest.TestCase):
     def test_cost_data_consistency(self):
         """Test that cached data remains consistent."""
         # Clear any cached data
-        import mock_data
-        mock_data._cached_data = None
+        clear_mock_cache()
 
         data1 = get_mock_costs(days=30)
         data2 = get_mock_costs(days=30)
@@ -243,6 +375,41 @@ class TestAPIWorkflow(unittest.TestCase):
         # Same request should return same cached data
         self.assertEqual(data1, data2)
 
+    def test_default_window_is_preloaded(self):
+        """Test the default 30-day window is generated once, from a fixed seed."""
+        import mock_data
+        clear_mock_cache()
+
+        self.assertIs(get_mock_costs(), get_mock_costs(days=30))
+        # Compare costs only: the preload's dates were fixed at import time
+        regenerated = generate_mock_costs(days=30, seed=mock_data.PRELOAD_SEED)
+        self.assertEqual(
+            [(day["total_cost"], day["services"]) for day in get_mock_costs()],
+            [(day["total_cost"], day["services"]) for day in regenerated]
+        )
+
+    def test_cost_data_json_matches_data(self):
+        """Test that the pre-serialized body encodes the cached data."""
+        clear_mock_cache()
+
+        body = json.loads(get_mock_costs_json(days=14))
+
+        self.assertTrue(body["success"])
+        self.assertEqual(body["mode"], "mock")
+        self.assertEqual(body["data"], list(get_mock_costs(days=14)))
+
+    def test_cost_data_cached_per_window(self):
+        """Test that alternating window sizes do not evict each other."""
+        clear_mock_cache()
+
+        data30 = get_mock_costs(days=30)
+        data7 = get_mock_costs(days=7)
+
+        self.assertEqual(len(data7), 7)
+        self.assertIs(get_mock_costs(days=30), data30)
+        self.assertIs(get_mock_costs(30), data30)
+        self.assertIs(get_mock_costs(days=7), data7)
+
     def test_anomaly_deviation_calculation(self):
         """Test that deviation is correctly calculated as cost minus expected."""
         cost_data = [
@@ -259,6 +426,16 @@ class TestAPIWorkflow(unittest.TestCase):
             expected_deviation = anomaly["total_cost"] - anomaly["expected_cost"]
             self.assertAlmostEqual(anomaly["deviation"], expected_deviation, places=1)
 
+    def test_columnar_detection_matches_records(self):
+        """Test the column-oriented data yields the same anomalies as the records."""
+        clear_mock_cache()
+
+        for threshold in [1.0, 1.5, 2.0]:
+            self.assertEqual(
+                detect_anomalies(get_mock_costs_soa(days=30), threshold),
+                detect_anomalies(get_mock_costs(days=30), threshold)
+            )
+
     def test_workflow_with_minimum_data(self):
         """Test workflow handles minimum viable data (2 data points)."""
         cost_data = [
@@ -271,6 +448,177 @@ class TestAPIWorkflow(unittest.TestCase):
         self.assertIsInstance(anomalies, list)
 
 
+class TestEndpointCaching(unittest.TestCase):
+    """Tests for cached mock-mode endpoint responses."""
+
+    def setUp(self):
+        import function_app
+        self.app = function_app
+        self.app._clear_caches()
+
+    def _get(self, route, params=None):
+        import azure.functions as func
+        return func.HttpRequest("GET", f"/api/{route}", params=params or {}, body=b"")
+
+    def test_anomalies_response_is_cached(self):
+        """Test repeat anomaly queries reuse the cached body."""
+        with patch.object(self.app, "detect_anomalies", wraps=detect_anomalies) as detect:
+            first = self.app.list_anomalies(self._get("anomalies", {"threshold": "2.0"}))
+            second = self.app.list_anomalies(self._get("anomalies", {"threshold": "2.0"}))
+
+        self.assertEqual(detect.call_count, 1)
+        self.assertEqual(first.get_body(), second.get_body())
+
+    def test_anomalies_cache_keyed_by_threshold(self):
+        """Test different thresholds are cached separately."""
+        with patch.object(self.app, "detect_anomalies", wraps=detect_anomalies) as detect:
+            self.app.list_anomalies(self._get("anomalies", {"threshold": "2.0"}))
+            self.app.list_anomalies(self._get("anomalies", {"threshold": "3.0"}))
+
+        self.assertEqual(detect.call_count, 2)
+
+    def test_summary_matches_cost_data(self):
+        """Test summary totals agree with the underlying mock data."""
+        data = json.loads(self.app.summary(self._get("summary")).get_body())["data"]
+        cost_data = get_mock_costs(days=30)
+
+        self.assertEqual(data["days"], 30)
+        self.assertAlmostEqual(data["total_cost"], sum(d["total_cost"] for d in cost_data), places=2)
+        self.assertAlmostEqual(data["total_cost"], sum(data["services"].values()), places=1)
+
+    def test_anomalies_cache_key_is_clamped_threshold(self):
+        """Test thresholds are used as given and only clamping shares cache entries."""
+        for threshold in ["2.004", "5.0", "9.0"]:
+            self.app.list_anomalies(self._get("anomalies", {"threshold": threshold}))
+
+        self.assertEqual(list(self.app._anomaly_cache), [(30, 2.004), (30, 5.0)])
+
+    def test_anomalies_rejects_non_finite_threshold(self):
+        """Test NaN and infinite thresholds are rejected without caching."""
+        for threshold in ["nan", "inf", "-inf"]:
+            response = self.app.list_anomalies(self._get("anomalies", {"threshold": threshold}))
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(json.loads(response.get_body())["success"])
+
+        self.assertEqual(len(self.app._anomaly_cache), 0)
+
+    def test_cache_is_bounded(self):
+        """Test the response cache evicts the oldest entry once full."""
+        with patch.object(self.app, "CACHE_MAX_ENTRIES", 3):
+            for threshold in ["1.0", "1.5", "2.0", "2.5"]:
+                self.app.list_anomalies(self._get("anomalies", {"threshold": threshold}))
+
+        self.assertEqual(list(self.app._anomaly_cache), [(30, 1.5), (30, 2.0), (30, 2.5)])
+
+    def test_cache_is_thread_safe(self):
+        """Test concurrent puts and clears neither raise nor exceed the bound."""
+        import threading
+        errors = []
+
+        def worker(thread_id):
+            try:
+                for i in range(2000):
+                    self.app._cache_put(self.app._anomaly_cache, (thread_id, i % 100), b"{}")
+                    if i % 250 == 0:
+                        self.app._clear_caches()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(self.app._anomaly_cache), self.app.CACHE_MAX_ENTRIES)
+
+    def test_cache_expires_after_ttl(self):
+        """Test cached bodies are recomputed once the TTL elapses."""
+        with patch.object(self.app, "get_mock_costs", wraps=get_mock_costs) as costs, \
+                patch.object(self.app, "CACHE_TTL_SECONDS", 0):
+            self.app.summary(self._get("summary"))
+            self.app.summary(self._get("summary"))
+
+        self.assertEqual(costs.call_count, 2)
+
+
+class TestIngestEvent(unittest.TestCase):
+    """Tests for the event ingestion endpoint in mock mode."""
+
+    def setUp(self):
+        import function_app
+        self.app = function_app
+        self.app._stats.clear()
+
+    def _request(self, event):
+        import azure.functions as func
+        return func.HttpRequest("POST", "/api/events", body=json.dumps(event).encode())
+
+    def _post(self, cost, subscription="test-sub"):
+        return self._request({
+            "subscriptionId": subscription,
+            "ts": "2024-01-05T10:00:00Z",
+            "service": "compute",
+            "resourceGroup": "rg-test",
+            "costUsd": cost
+        })
+
+    def test_ingest_scores_against_running_stats(self):
+        """Test each event is scored against the subscription's earlier events."""
+        for cost in [100.0, 110.0, 90.0, 100.0]:
+            self.app.ingest_event(self._post(cost))
+        response = self.app.ingest_event(self._post(400.0))
+        body = json.loads(response.get_body())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(body["z_score"], 3)
+        self.assertEqual(self.app._stats["test-sub"][0], 5)
+
+    def test_ingest_mock_events_are_bounded(self):
+        """Test the in-memory event store evicts the oldest events when full."""
+        with patch.object(self.app, "_mock_events", deque(maxlen=2)) as events:
+            for cost in [1.0, 2.0, 3.0]:
+                self.app.ingest_event(self._post(cost))
+
+        self.assertEqual([doc["costUsd"] for doc in events], [2.0, 3.0])
+
+    def test_ingest_rejects_invalid_timestamp(self):
+        """Test events with an invalid timestamp are rejected, not stored."""
+        event = {"ts": "2024-13-45T00:00:00Z", "service": "compute", "resourceGroup": "rg", "costUsd": 1.0}
+        with patch.object(self.app, "_mock_events", deque()) as events:
+            response = self.app.ingest_event(self._request(event))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(events), 0)
+
+    def test_ingest_rejects_invalid_event(self):
+        """Test events with missing fields or negative cost are rejected."""
+        bad_events = [
+            {"ts": "2024-01-05T10:00:00Z", "service": "compute", "costUsd": 1.0},
+            {"ts": "2024-01-05T10:00:00Z", "service": "compute", "resourceGroup": "rg", "costUsd": -1.0},
+        ]
+        for event in bad_events:
+            response = self.app.ingest_event(self._request(event))
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(json.loads(response.get_body())["ok"])
+
+    def test_ingest_stats_are_bounded(self):
+        """Test the least recently used subscription's stats are evicted once full."""
+        with patch.object(self.app, "MAX_TRACKED_SUBSCRIPTIONS", 2):
+            for subscription in ["a", "b", "a", "c"]:
+                self.app.ingest_event(self._post(100.0, subscription=subscription))
+
+        self.assertEqual(list(self.app._stats), ["a", "c"])
+
+    def test_ingest_stats_are_per_subscription(self):
+        """Test a new subscription starts with empty statistics."""
+        self.app.ingest_event(self._post(100.0))
+        body = json.loads(self.app.ingest_event(self._post(400.0, subscription="other")).get_body())
+
+        self.assertEqual(body["z_score"], 0.0)
+
+
 # Run tests with: python3 test_api_workflow.py
 if __name__ == "__main__":
     unittest.main(verbosity=2)